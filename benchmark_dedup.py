@@ -0,0 +1,164 @@
+# =============================================================================
+# Benchmark: Near-Duplicate Response Collapsing
+# --------
+# Generates a large synthetic panel from data/mock_beer_data.csv by perturbing
+# the seed responses (case, punctuation, spacing, typos, short-form answers,
+# recombined sentences) plus semantically different near-duplicates (swapped
+# brands, added negation, changed prices or pack sizes, single-word swaps), and
+# reports dedup ratio, throughput, group purity and false-merge rate (overall and
+# per kind of contradiction) for collapse_near_duplicates.
+#
+# Usage: python benchmark_dedup.py [--rows 100000] [--seed 42]
+# =============================================================================
+
+import argparse
+import csv
+import random
+import re
+import time
+
+from dedup_responses import collapse_near_duplicates
+
+
+def perturb(text: str, rng: random.Random) -> str:
+    """Apply light, meaning-preserving noise of the kind seen in real open-ends."""
+    if rng.random() < 0.3:
+        text = text.lower()
+    if rng.random() < 0.3:
+        text = text.replace("’", "'")
+    if rng.random() < 0.2:
+        text = text.replace(". ", " - ").replace(",", "")
+    if rng.random() < 0.2:
+        text = text.rstrip(".") + rng.choice(["!", "!!", " ", "..."])
+    if rng.random() < 0.2:
+        text = re.sub(r" ", "  ", text, count=rng.randint(1, 3))
+    if rng.random() < 0.15 and len(text) > 10:
+        i = rng.randrange(len(text) - 1)
+        text = text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    return text
+
+
+CONTRADICTIONS = ["primary", "secondary", "negation", "price", "word"]
+
+# Close-looking prices and pack sizes, so price variants differ by a digit, a decimal point or a sign
+PRICES = ["$4.99", "$499", "$5.99", "$4.49", "$14.99", "4.99%"]
+PACK_SIZES = ["6", "12", "18", "1200"]
+
+# Single-word swaps that change meaning, including real words one letter apart
+WORD_SWAPS = {
+    "light": ["heavy", "night"],
+    "crisp": ["flat"],
+    "smooth": ["rough"],
+    "smoother": ["sweeter"],
+    "stronger": ["weaker", "stranger"],
+    "affordable": ["expensive"],
+    "refreshing": ["filling"],
+    "reliable": ["pricey"],
+    "easy": ["hard"],
+    "classic": ["basic"],
+    "flavor": ["favor"],
+}
+
+
+def contradict(text: str, brands: list[str], rng: random.Random) -> tuple[str, str]:
+    """Change what a seed answer says while keeping it textually close; returns (text, kind)."""
+    primary = text.split(".")[0]
+    others = [b for b in brands if b != primary]
+    secondary = [b for b in others if b in text]
+    swappable = [w for w in WORD_SWAPS if re.search(rf"\b{w}\b", text)]
+    kind = rng.choice(CONTRADICTIONS)
+
+    if kind == "secondary" and secondary:
+        old = rng.choice(secondary)
+        return text.replace(old, rng.choice([b for b in others if b != old]), 1), kind
+    if kind == "negation":
+        for verb in ("like", "choose", "pick", "buy", "stick"):
+            if f"I {verb}" in text:
+                return text.replace(f"I {verb}", f"I don’t {verb}", 1), kind
+    if kind == "word" and swappable:
+        old = rng.choice(swappable)
+        return re.sub(rf"\b{old}\b", rng.choice(WORD_SWAPS[old]), text, count=1), kind
+    if kind == "price":
+        return f"{text} I usually pay {rng.choice(PRICES)} for a {rng.choice(PACK_SIZES)} pack.", kind
+    return rng.choice(others) + text[len(primary):], "primary"
+
+
+def generate_synthetic_rows(seed_rows: list[dict], n: int, rng: random.Random) -> list[tuple[dict, str, str | None]]:
+    """
+    Return (row, source, contradiction) triples; source is the unperturbed text a row was
+    derived from and contradiction names the kind of change for semantically different
+    near-duplicates of a seed (None otherwise).
+    """
+    sentences = [re.split(r"(?<=\.) ", row["response"]) for row in seed_rows]
+    brands = sorted({s[0] for s in sentences})
+    brand_names = [b.rstrip(".") for b in brands]
+    short_reasons = ["Taste.", "Price.", "Cheap.", "Always available.", "Habit.", "Smooth."]
+
+    synthetic = []
+    for i in range(n):
+        roll = rng.random()
+        contradiction = None
+        if roll < 0.15:
+            # Short-form answer, e.g. "Budweiser. Taste."
+            text = f"{rng.choice(brands)} {rng.choice(short_reasons)}"
+        elif roll < 0.25:
+            # Recombined answer: brand sentence from one seed, the rest from another
+            a, b = rng.sample(range(len(sentences)), 2)
+            text = " ".join(sentences[a][:2] + sentences[b][2:])
+        elif roll < 0.35:
+            # Near-duplicate of a seed that says something different
+            text, contradiction = contradict(rng.choice(seed_rows)["response"], brand_names, rng)
+        else:
+            text = rng.choice(seed_rows)["response"]
+        synthetic.append(({"name": f"R{i + 1:06d}", "response": perturb(text, rng)}, text, contradiction))
+    return synthetic
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark near-duplicate response collapsing on synthetic data.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    args = parser.parse_args()
+
+    with open("data/mock_beer_data.csv", newline="", encoding="utf-8") as f:
+        seed_rows = list(csv.DictReader(f))
+
+    synthetic = generate_synthetic_rows(seed_rows, args.rows, random.Random(args.seed))
+    rows = [row for row, _, _ in synthetic]
+    source = {row["name"]: key for row, key, _ in synthetic}
+    contradicted = {row["name"]: kind for row, _, kind in synthetic if kind}
+
+    start = time.perf_counter()
+    groups = collapse_near_duplicates(rows, threshold=args.threshold)
+    elapsed = time.perf_counter() - start
+
+    # Purity: share of respondents whose group is dominated by their own unperturbed source text
+    pure = 0
+    for group in groups:
+        keys = [source[r] for r in group["respondents"]]
+        pure += max(keys.count(k) for k in set(keys))
+
+    # False merge: a respondent whose source text differs from that of the quoted (first) respondent
+    false_merged = {r for group in groups for r in group["respondents"]
+                    if source[r] != source[group["respondents"][0]]}
+
+    print(f"rows:           {len(rows):,}")
+    print(f"seed responses: {len(seed_rows)}")
+    print(f"distinct texts: {len({row['response'] for row in rows}):,}")
+    print(f"distinct srcs:  {len(set(source.values())):,}")
+    print(f"groups:         {len(groups):,}")
+    print(f"dedup ratio:    {len(rows) / len(groups):.1f}x ({1 - len(groups) / len(rows):.2%} of rows collapsed)")
+    print(f"group purity:   {pure / len(rows):.2%}")
+    print(f"false merges:   {len(false_merged) / len(rows):.2%} of all rows, "
+          f"{len(false_merged & contradicted.keys()) / len(contradicted):.2%} of {len(contradicted):,} contradicting near-duplicates")
+    for kind in CONTRADICTIONS:
+        names = {name for name, k in contradicted.items() if k == kind}
+        if names:
+            print(f"  {kind + ':':<14}{len(false_merged & names) / len(names):.2%} of {len(names):,}")
+    print(f"largest group:  {max(g['weight'] for g in groups):,}")
+    print(f"elapsed:        {elapsed:.2f}s ({len(rows) / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
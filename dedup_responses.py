@@ -0,0 +1,274 @@
+# =============================================================================
+# Near-Duplicate Response Collapsing
+# --------
+# Preprocessing stage that groups identical and near-identical open-ended
+# responses (e.g. "Budweiser. Taste." / "budweiser - taste") before they are
+# injected into agent prompts. Each group is sent to the LLM once with a
+# multiplicity weight; the list of respondents it stands for stays in Python,
+# so that n/total counts and quote attribution can be expanded back exactly.
+#
+# Pure standard library: MinHash signatures are built from shake_128 digests
+# (one independent 32-bit hash per permutation) and candidates are found with
+# banded LSH.
+# =============================================================================
+
+import difflib
+import hashlib
+import re
+import unicodedata
+from array import array
+from collections import Counter
+
+
+NON_WORD = re.compile(r"[\W_]+")
+
+# Numbers keep their currency sign, inner "." / "," and trailing "%" ("$4.99", "5%"),
+# so that different prices, shares and pack sizes never normalize to the same text
+NUMBER = re.compile(r"[$€£¥]?\d(?:[\d.,]*\d)?%?")
+
+# Words whose presence on only one side always blocks a near-duplicate merge
+# ("don't" normalizes to "don t", hence the bare "t")
+NEGATIONS = frozenset({"no", "not", "never", "nor", "neither", "none", "nothing", "without",
+                       "t", "dont", "doesnt", "didnt", "isnt", "cant", "wont"})
+
+
+def normalize_response(text: str) -> str:
+    """
+    Casefold, fold unicode punctuation and collapse everything that isn't a letter or
+    digit to single spaces. Numbers are kept whole, including "$", "%", "." and ",".
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    parts, pos = [], 0
+    for match in NUMBER.finditer(text):
+        parts += [NON_WORD.sub(" ", text[pos:match.start()]), match.group()]
+        pos = match.end()
+    parts.append(NON_WORD.sub(" ", text[pos:]))
+    return " ".join(" ".join(parts).split())
+
+
+def exact_key(text: str) -> tuple[str, str]:
+    """
+    Key for exact grouping: ("text", normalized) for answers with letters or digits,
+    ("symbols", raw) for answers that normalize to nothing (e.g. "?!" or emoji) and
+    ("blank", "") for empty answers, so the three kinds never share a group.
+    """
+    normalized = normalize_response(text)
+    if normalized:
+        return ("text", normalized)
+    stripped = (text or "").strip()
+    if stripped:
+        return ("symbols", stripped)
+    return ("blank", "")
+
+
+def shingle(normalized: str, k: int = 5) -> set[str]:
+    """Character k-shingles of a normalized response (short responses become a single shingle)."""
+    if len(normalized) <= k:
+        return {normalized}
+    return {normalized[i:i + k] for i in range(len(normalized) - k + 1)}
+
+
+def minhash_signature(shingles: set[str], num_perm: int = 64, cache: dict | None = None) -> tuple[int, ...]:
+    """
+    MinHash signature of a shingle set.
+
+    Each shingle is hashed once into num_perm independent 32-bit values, and the
+    signature is the column-wise minimum. Shingle hashes are memoised in cache,
+    since open-ends on the same question share most of their vocabulary.
+    """
+    if cache is None:
+        cache = {}
+    columns = []
+    for s in shingles:
+        hashes = cache.get(s)
+        if hashes is None:
+            hashes = array("I", hashlib.shake_128(s.encode("utf-8")).digest(4 * num_perm))
+            cache[s] = hashes
+        columns.append(hashes)
+    return tuple(map(min, zip(*columns)))
+
+
+def estimated_jaccard(sig_a: tuple[int, ...], sig_b: tuple[int, ...]) -> float:
+    """Fraction of agreeing MinHash positions, an unbiased estimate of Jaccard similarity."""
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / len(sig_a)
+
+
+def is_typo(a: str, b: str) -> bool:
+    """
+    True if b is a's adjacent letters transposed ("coors" / "ocors") or a doubled letter
+    written once or twice too often ("classic" / "clasic"). Substitutions are never
+    treated as typos, since they turn real words into other real words ("better" /
+    "bitter", "light" / "night").
+    """
+    if abs(len(a) - len(b)) > 1 or a == b:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        doubled = (i > 0 and b[i - 1] == b[i]) or (i + 1 < len(b) and b[i + 1] == b[i])
+        return doubled and a[i:] == b[i + 1:]
+    return a[i + 2:] == b[i + 2:] and a[i:i + 2] == b[i:i + 2][::-1]
+
+
+def same_substance(a: str, b: str) -> bool:
+    """
+    True if two normalized texts differ only by typos.
+
+    The word sequences are diffed in order; every changed span must be a re-spacing
+    ("coorsw hen" / "coors when") or an is_typo slip of at least 4 characters, and
+    no negation or number may be added, removed or changed. A swapped or reordered
+    brand, a different price or an added "don't" therefore blocks the merge, however
+    similar the rest of the answer is.
+    """
+    words_a, words_b = a.split(), b.split()
+    matcher = difflib.SequenceMatcher(None, words_a, words_b, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        removed, added = "".join(words_a[i1:i2]), "".join(words_b[j1:j2])
+        if any(ch.isdigit() for ch in removed + added):
+            return False
+        if removed == added:
+            continue
+        if NEGATIONS.intersection(words_a[i1:i2] + words_b[j1:j2]):
+            return False
+        if min(len(removed), len(added)) < 4 or not is_typo(removed, added):
+            return False
+    return True
+
+
+def collapse_near_duplicates(rows: list[dict],
+                             text_field: str = "response",
+                             id_field: str = "name",
+                             threshold: float = 0.8,
+                             num_perm: int = 64,
+                             bands: int = 16) -> list[dict]:
+    """
+    Group near-duplicate responses and return one JSON-serializable row per group.
+
+    Rows are first grouped exactly on their normalized text. Distinct normalized
+    texts are then clustered greedily, most frequent first: a text joins the first
+    group leader whose estimated Jaccard similarity is >= threshold and that passes
+    same_substance (differs only by typos), otherwise it becomes a new leader. Only
+    leaders are indexed in the LSH buckets, so every member is compared against
+    (and says the same thing as) the response that is quoted.
+
+    Respondent ids are converted with str() and stripped, and must be present and
+    unique, since counts and quote attribution are expanded back per id; a ValueError
+    is raised otherwise. The returned respondents are these normalized ids.
+
+    Each returned group looks like:
+        {"group_id": "G1", "response": <verbatim text of first respondent>,
+         "weight": <number of respondents>, "respondents": [<ids>, ...]}
+    """
+    if num_perm % bands:
+        raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+    rows_per_band = num_perm // bands
+
+    ids = ["" if row.get(id_field) is None else str(row.get(id_field)).strip() for row in rows]
+    missing = [str(index + 1) for index, respondent in enumerate(ids) if not respondent]
+    if missing:
+        raise ValueError(f"Missing '{id_field}' in row(s): {', '.join(missing)}")
+    duplicates = sorted(respondent for respondent, count in Counter(ids).items() if count > 1)
+    if duplicates:
+        raise ValueError(f"Duplicate '{id_field}' value(s): {', '.join(duplicates)}")
+
+    # Pass 1: exact grouping on normalized text (keeps first-seen order)
+    exact: dict[tuple[str, str], list[int]] = {}
+    for index, row in enumerate(rows):
+        exact.setdefault(exact_key(row.get(text_field, "")), []).append(index)
+
+    # Pass 2: MinHash/LSH over the distinct normalized texts
+    ordered = sorted(exact, key=lambda key: len(exact[key]), reverse=True)
+    leaders: list[tuple[str, str]] = []
+    leader_sigs: dict[tuple[str, str], tuple[int, ...]] = {}
+    members: dict[tuple[str, str], list[tuple[str, str]]] = {}
+    buckets: dict[tuple, list[tuple[str, str]]] = {}
+    cache: dict = {}
+
+    for norm in ordered:
+        if norm[0] != "text":
+            # Blank and symbol-only responses are only ever grouped exactly
+            leaders.append(norm)
+            members[norm] = [norm]
+            continue
+
+        sig = minhash_signature(shingle(norm[1]), num_perm, cache)
+        keys = [(b, sig[b * rows_per_band:(b + 1) * rows_per_band]) for b in range(bands)]
+
+        leader = None
+        seen = set()
+        for key in keys:
+            for candidate in buckets.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if (estimated_jaccard(sig, leader_sigs[candidate]) >= threshold
+                        and same_substance(norm[1], candidate[1])):
+                    leader = candidate
+                    break
+            if leader is not None:
+                break
+
+        if leader is None:
+            leaders.append(norm)
+            leader_sigs[norm] = sig
+            members[norm] = [norm]
+            for key in keys:
+                buckets.setdefault(key, []).append(norm)
+        else:
+            members[leader].append(norm)
+
+    # Restore input order of groups and build output rows
+    first_seen = {norm: i for i, norm in enumerate(exact)}
+    groups = []
+    for leader in sorted(leaders, key=lambda norm: first_seen[norm]):
+        # Quote the leader's (most frequent) wording, attributed to its first respondent
+        quoted = exact[leader][0]
+        others = sorted(index for norm in members[leader] for index in exact[norm] if index != quoted)
+        respondents = [ids[index] for index in [quoted, *others]]
+        groups.append({
+            "group_id": f"G{len(groups) + 1}",
+            "response": rows[quoted].get(text_field, ""),
+            "weight": len(respondents),
+            "respondents": respondents,
+        })
+    return groups
+
+
+def prompt_rows(groups: list[dict]) -> list[dict]:
+    """
+    LLM-facing view of the groups: group_id, verbatim response, weight and the id of
+    the respondent being quoted. The full respondent lists are left out so prompt size
+    grows with the number of distinct answers, not the number of respondents.
+    """
+    return [{
+        "group_id": group["group_id"],
+        "response": group["response"],
+        "weight": group["weight"],
+        "quoted_respondent": group["respondents"][0],
+    } for group in groups]
+
+
+def expand_group_codes(groups: list[dict], group_codes: dict[str, list[str]]) -> dict[str, list[str]]:
+    """
+    Expand codes assigned per group back to per-respondent codes.
+
+    group_codes maps a code (e.g. a theme name) to the group_ids it was assigned to;
+    the result maps each respondent to the codes they carry. Unknown group_ids raise
+    a ValueError so a miscoded group can't silently drop respondents from the counts.
+    """
+    by_id = {group["group_id"]: group for group in groups}
+    respondent_codes: dict[str, list[str]] = {r: [] for group in groups for r in group["respondents"]}
+    for code, group_ids in group_codes.items():
+        unknown = [gid for gid in group_ids if gid not in by_id]
+        if unknown:
+            raise ValueError(f"Unknown group_id(s) for code '{code}': {', '.join(unknown)}")
+        for gid in dict.fromkeys(group_ids):
+            for respondent in by_id[gid]["respondents"]:
+                if code not in respondent_codes[respondent]:
+                    respondent_codes[respondent].append(code)
+    return respondent_codes
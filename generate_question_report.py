@@ -19,6 +19,8 @@ from pydantic import BaseModel
 from typing import Annotated, Optional
 from enum import Enum
 
+from dedup_responses import collapse_near_duplicates, expand_group_codes, prompt_rows
+
 
 # Load environment variables from .env file (expects OPENAI_API_KEY)
 load_dotenv()
@@ -65,7 +67,10 @@ def generate_question_report():
         "csv_headers": [],
         "csv_rows": [],
         "csv_rows_total": 0,
+        "csv_groups_total": 0,
         "csv_text": "",
+        "response_groups": [],
+        "theme_tallies": {},
         "analysis_plan": "",
         "report_draft": "",
         "feedback_collection": {},
@@ -87,10 +92,16 @@ def generate_question_report():
         headers = reader.fieldnames or []
         rows = list(reader)
 
+    # Collapse identical / near-identical responses so each is sent to the LLM once
+    groups = collapse_near_duplicates(rows, text_field="response", id_field="name")
+
     # Store in context (must be JSON-serializable)
-    shared_context["csv_headers"] = headers
-    shared_context["csv_rows"] = rows              # full dataset is tiny, safe to include
-    shared_context["csv_rows_total"] = len(rows)
+    group_rows = prompt_rows(groups)
+    shared_context["csv_headers"] = list(group_rows[0]) if group_rows else headers
+    shared_context["csv_rows"] = group_rows        # one row per response group (no respondent lists)
+    shared_context["csv_rows_total"] = len(rows)   # total respondents (denominator for n/total)
+    shared_context["csv_groups_total"] = len(groups)
+    shared_context["response_groups"] = groups     # full respondent lists, never injected into prompts
     shared_context["csv_text"] = csv_text          # optional, avoid injecting unless you need it
 
 
@@ -130,6 +141,12 @@ def generate_question_report():
     def submit_report_draft(content: Annotated[str, "Full text content of the report draft"],
                             context_variables: ContextVariables) -> ReplyResult:
         """Submit the initial report draft and advance to REVIEWING stage."""
+        if not context_variables["theme_tallies"]:
+            return ReplyResult(
+                message="Draft rejected: no exact theme counts yet. Call tally_theme_respondents first and use its n/total values.",
+                target=AgentTarget(report_drafter_agent),
+                context_variables=context_variables,
+            )
         context_variables["report_draft"] = content
         context_variables["current_stage"] = ReportStage.REVIEWING.value
         return ReplyResult(
@@ -139,6 +156,36 @@ def generate_question_report():
         )
 
 
+    # Stage 3b: Exact theme counts (expand group weights back to respondents)
+    def tally_theme_respondents(theme_groups: Annotated[dict[str, list[str]], "Mapping of theme name to the group_ids coded with that theme"],
+                                context_variables: ContextVariables) -> ReplyResult:
+        """Expand theme codes from response groups to individual respondents and return exact n/total counts."""
+        # Called by the drafter, and by the reviser when themes change during revision
+        caller = report_reviser_agent if context_variables["current_stage"] == ReportStage.REVISING.value else report_drafter_agent
+        try:
+            respondent_codes = expand_group_codes(context_variables["response_groups"], theme_groups)
+        except ValueError as e:
+            return ReplyResult(
+                message=f"Tally failed: {e}. Use group_ids exactly as listed in the data.",
+                target=AgentTarget(caller),
+                context_variables=context_variables,
+            )
+
+        total = context_variables["csv_rows_total"]
+        tallies = {}
+        for theme in theme_groups:
+            n = sum(theme in codes for codes in respondent_codes.values())
+            tallies[theme] = {"n": n, "total": total}
+        context_variables["theme_tallies"] = tallies
+
+        lines = [f"- {theme}: {t['n']}/{total}" for theme, t in tallies.items()]
+        return ReplyResult(
+            message="Exact theme counts (use these n/total values in the report):\n" + "\n".join(lines),
+            target=AgentTarget(caller),
+            context_variables=context_variables,
+        )
+
+
     # Stage 4: Reviewing
     class FeedbackItem(BaseModel):
         section: str
@@ -258,12 +305,15 @@ def generate_question_report():
             
 
             WORKFLOW & REQUIREMENTS:
-            1) Read the data. The data is provided in csv format below (headers and rows):
+            1) Read the data. Identical and near-identical responses have been collapsed into groups.
+            Each row below is one response group: `response` is the verbatim text of `quoted_respondent`,
+            and `weight` is the number of respondents the group stands for.
             {csv_headers}
             {csv_rows}
 
-            The total number of rows is:
+            The total number of respondents is:
             {csv_rows_total}
+            (collapsed into {csv_groups_total} response groups)
             
 
             2) Design the analysis plan tailored to the question and data provided:
@@ -271,6 +321,7 @@ def generate_question_report():
             - Define classification rules, labels, and decision criteria (e.g., directional buckets, mutually exclusive vs. multi-label coding).
             - Specify clustering/theming steps and consolidation logic (e.g., when to merge/split themes; max theme count if applicable).
             - Describe light quantification expectations (**counts with total sample size**, e.g., 4/15, where 4 = number of respondents mentioning a theme and 15 = total who answered).
+              Counts are per respondent, not per group: a group with weight 3 counts as 3 respondents.
             - Set guidance for selecting illustrative quotes (e.g., how many, attribution format).
             - Include narrative synthesis expectations (how to integrate drivers/deterrents, segments/contexts, contradictions).
             - Define the final deliverable structure (tables/sections/labels) that the drafting agent should produce.
@@ -339,7 +390,7 @@ def generate_question_report():
         report_drafter_agent = ConversableAgent(
             name="report_drafter_agent",
             system_message="""You are the report drafter agent.""",
-            functions=[submit_report_draft],
+            functions=[tally_theme_respondents, submit_report_draft],
             update_agent_state_before_reply=[UpdateSystemMessage("""
             
             ROLE:  
@@ -347,18 +398,22 @@ def generate_question_report():
             into a clear, structured first draft report by strictly following the provided analysis plan.  
 
             TOOLS:   
+            • tally_theme_respondents(theme_groups: dict[str, list[str]], context_variables: ContextVariables) — Get exact n/total counts per theme from the group_ids coded with it.
             • submit_report_draft(content: str, context_variables: ContextVariables) — Submit your completed draft report.  
 
             INPUTS:  
             • {question_text} — The survey question being analyzed.   
 
             TASK:  
-            1. Read the data. The data is provided in csv format below (headers and rows):
+            1. Read the data. Identical and near-identical responses have been collapsed into groups.
+            Each row below is one response group: `response` is the verbatim text of `quoted_respondent`,
+            and `weight` is the number of respondents the group stands for.
             {csv_headers}
             {csv_rows}
 
-            The total number of rows is:
+            The total number of respondents is:
             {csv_rows_total}
+            (collapsed into {csv_groups_total} response groups)
 
             2. **Follow the analysis plan exactly**  
             Here is the analysis plan:
@@ -370,6 +425,9 @@ def generate_question_report():
             - Categorize, cluster, and theme according to the plan.  
             - Apply any specific definitions, labels, or classification rules given.  
             - Quantify, summarize, and select illustrative quotes exactly as the plan directs.  
+            - Code themes per response group, then call *tally_theme_respondents* once with every theme mapped to its group_ids.
+            Use the returned n/total values as-is; do not count groups yourself.
+            - Attribute each quote to the `quoted_respondent` of its group (the text is verbatim from them).
 
             3. **Craft the full draft report**  
             - Include all required sections in the exact structure specified in the plan.  
@@ -411,18 +469,23 @@ def generate_question_report():
 
             WORKFLOW-(complete in order):  
             1. **Gather Context**  
-               a. Read the data. The data is provided in csv format below (headers and rows):
+               a. Read the data. Identical and near-identical responses have been collapsed into groups.
+               Each row below is one response group: `response` is the verbatim text of `quoted_respondent`,
+               and `weight` is the number of respondents the group stands for.
                {csv_headers}
                {csv_rows}
 
-               The total number of rows is:
+               The total number of respondents is:
                {csv_rows_total}
+               (collapsed into {csv_groups_total} response groups)
                b. Review the report draft : {report_draft}  
                c. Review the analysis plan : {analysis_plan}
+               d. Review the exact theme counts computed from the groups : {theme_tallies}
 
             2. **Evaluate the report draft** against:  
                • Analysis plan compliance & completeness  
                • Thematic accuracy and evidence support 
+               • n/total counts match the exact theme counts and quotes are attributed to the quoted_respondent of their group
                • Clarity, logic, and flow of writing  
                • Neutrality and stakeholder-friendliness  
 
@@ -456,7 +519,7 @@ def generate_question_report():
             system_message="""
             You are the report reviser agent.
             """,
-            functions=[submit_revised_report],
+            functions=[tally_theme_respondents, submit_revised_report],
             update_agent_state_before_reply=[UpdateSystemMessage("""
             ROLE: 
             You are the report reviser agent responsible for implementing feedback.
@@ -468,8 +531,19 @@ def generate_question_report():
             • Current report draft: {report_draft} 
             • Feedback from report_reviewer_agent: {feedback_collection} 
             • Original analysis plan: {analysis_plan}
+            • Exact theme counts behind the current draft: {theme_tallies}
+            • The data. Identical and near-identical responses have been collapsed into groups.
+            Each row below is one response group: `response` is the verbatim text of `quoted_respondent`,
+            and `weight` is the number of respondents the group stands for.
+            {csv_headers}
+            {csv_rows}
+
+            The total number of respondents is:
+            {csv_rows_total}
+            (collapsed into {csv_groups_total} response groups)
         
             TOOLS: 
+            • tally_theme_respondents(theme_groups: dict[str, list[str]], context_variables: ContextVariables) — Get exact n/total counts per theme from the group_ids coded with it.
             • submit_revised_report(content: str, changes_made: Optional[list[str]], context_variables: ContextVariables) - Submit the revised report.
 
             WORKFLOW (complete in order): 
@@ -481,6 +555,10 @@ def generate_question_report():
             2. **Revise the Report**  
             • Make targeted edits that directly address each feedback item.  
             • Preserve existing strengths and accurate content.  
+            • Whenever a theme is added, split, merged, renamed or recoded, code the affected response groups and call
+            *tally_theme_respondents* once with EVERY theme in the revised report mapped to its group_ids (it replaces the stored counts).
+            Use the returned n/total values as-is; never estimate counts yourself.
+            • Attribute each quote to the `quoted_respondent` of its group.
             • Maintain all formatting constraints (e.g., no triple back-ticks; end with “# End of Report”).
 
             3. **Document Changes**  
@@ -0,0 +1,115 @@
+import pytest
+
+from dedup_responses import collapse_near_duplicates, expand_group_codes, normalize_response, prompt_rows
+
+
+def make_rows(*responses):
+    return [{"name": f"R{i + 1}", "response": text} for i, text in enumerate(responses)]
+
+
+def test_normalize_keeps_non_ascii_letters():
+    assert normalize_response("Café crème!") == "café crème"
+    assert normalize_response("Пиво Балтика. Вкус.") == "пиво балтика вкус"
+    assert normalize_response("?!") == ""
+
+
+def test_normalize_keeps_numbers_whole():
+    assert normalize_response("About $4.99, maybe 5% more.") == "about $4.99 maybe 5% more"
+    assert normalize_response("1,200 pack") == "1,200 pack"
+
+
+def test_numbers_prices_and_percentages_stay_separate():
+    groups = collapse_near_duplicates(make_rows("$5", "5%", "5", "$5."))
+    assert [g["weight"] for g in groups] == [2, 1, 1]
+
+
+def test_different_prices_are_not_merged():
+    seed = "Budweiser. I like the classic taste and I usually pay about $4.99 for a six pack. Sometimes I'll go for Coors if I want something different."
+    groups = collapse_near_duplicates(make_rows(seed, seed.replace("$4.99", "$499")))
+    assert [g["weight"] for g in groups] == [1, 1]
+
+
+def test_exact_merge_after_normalization():
+    groups = collapse_near_duplicates(make_rows("Budweiser. Taste.", "budweiser - taste", "Coors. Price."))
+    assert [g["weight"] for g in groups] == [2, 1]
+    assert groups[0]["response"] == "Budweiser. Taste."
+    assert groups[0]["respondents"] == ["R1", "R2"]
+
+
+@pytest.mark.parametrize("old, new", [
+    ("classic", "clasic"),                       # dropped letter
+    ("for Coors if", "for Coorsi f"),            # transposition across a space
+])
+def test_near_merge_of_typo(old, new):
+    seed = "Budweiser. I like the classic taste and branding. Sometimes I'll go for Coors if I want something different."
+    groups = collapse_near_duplicates(make_rows(seed, seed.replace(old, new)))
+    assert len(groups) == 1
+    assert groups[0]["weight"] == 2
+
+
+@pytest.mark.parametrize("old, new", [
+    ("Coors if", "Miller if"),                   # secondary brand
+    ("I like the", "I don't like the"),          # negation
+    ("Budweiser. I", "Heineken. I"),             # primary brand
+    ("1200 pack", "1600 pack"),                  # number
+    ("better", "bitter"),                        # real word one substitution away
+    ("Coors Light", "Coors Night"),              # product name one substitution away
+    ("flavor", "favor"),                         # real word one deletion away
+])
+def test_substantive_differences_are_not_merged(old, new):
+    seed = ("Budweiser. I like the classic taste and branding, and it goes better with food than Coors Light. "
+            "I usually choose it because it feels like the all-American beer and buy the 1200 pack for the flavor. "
+            "Sometimes I'll go for Coors if I want something different.")
+    groups = collapse_near_duplicates(make_rows(seed, seed.replace(old, new)))
+    assert [g["weight"] for g in groups] == [1, 1]
+
+
+def test_swapped_brands_are_not_merged():
+    groups = collapse_near_duplicates(make_rows(
+        "Budweiser. It's refreshing and feels a little different from the usual. Sometimes I'll buy Coors instead.",
+        "Coors. It's refreshing and feels a little different from the usual. Sometimes I'll buy Budweiser instead.",
+    ))
+    assert [g["weight"] for g in groups] == [1, 1]
+
+
+def test_blank_symbols_and_non_ascii_stay_separate():
+    groups = collapse_near_duplicates(make_rows("Пиво Балтика. Вкус.", "Жигули. Дёшево.", "", "ビール", "?!", "  "))
+    assert [g["response"] for g in groups] == ["Пиво Балтика. Вкус.", "Жигули. Дёшево.", "", "ビール", "?!"]
+    assert [g["weight"] for g in groups] == [1, 1, 2, 1, 1]
+
+
+def test_duplicate_or_missing_ids_raise():
+    with pytest.raises(ValueError, match="Duplicate 'name'.*Michael"):
+        collapse_near_duplicates([{"name": "Michael", "response": "Taste."}, {"name": "Michael", "response": "Taste."}])
+    with pytest.raises(ValueError, match="Missing 'name'.*2"):
+        collapse_near_duplicates([{"name": "Michael", "response": "Taste."}, {"response": "Taste."}])
+
+
+def test_ids_are_normalized_once():
+    groups = collapse_near_duplicates([{"name": 7, "response": "Taste."}, {"name": " R2 ", "response": "taste"}])
+    assert groups[0]["respondents"] == ["7", "R2"]
+    with pytest.raises(ValueError, match="Duplicate 'name'.*7"):
+        collapse_near_duplicates([{"name": 7, "response": "Taste."}, {"name": "7 ", "response": "Price."}])
+
+
+def test_expand_group_codes_unknown_group_id():
+    groups = collapse_near_duplicates(make_rows("Budweiser. Taste.", "Coors. Price."))
+    with pytest.raises(ValueError, match="G9"):
+        expand_group_codes(groups, {"taste": ["G1", "G9"]})
+
+
+def test_expanded_counts_match_weights():
+    groups = collapse_near_duplicates(make_rows("Budweiser. Taste.", "budweiser taste", "Coors. Price.", ""))
+    respondent_codes = expand_group_codes(groups, {"all": [g["group_id"] for g in groups], "taste": ["G1"]})
+    n_all = sum("all" in codes for codes in respondent_codes.values())
+    n_taste = sum("taste" in codes for codes in respondent_codes.values())
+    assert n_all == sum(g["weight"] for g in groups) == 4
+    assert n_taste == groups[0]["weight"] == 2
+
+
+def test_prompt_rows_leave_out_respondent_lists():
+    groups = collapse_near_duplicates(make_rows("Budweiser. Taste.", "budweiser taste", "Coors. Price."))
+    assert prompt_rows(groups) == [
+        {"group_id": "G1", "response": "Budweiser. Taste.", "weight": 2, "quoted_respondent": "R1"},
+        {"group_id": "G2", "response": "Coors. Price.", "weight": 1, "quoted_respondent": "R3"},
+    ]